@@ -1,33 +1,60 @@
 """
 FastAPI application exposing REST endpoints for the order-status chatbot.
 
-This module defines three endpoints:
+This module defines four endpoints:
   - POST /conversations: create a new conversation and return its ID.
   - GET /conversations/{conversation_id}/messages: retrieve the conversation history,
     excluding internal tool messages.
   - POST /conversations/{conversation_id}/messages: send a new user message and
     receive an assistant reply (and tool result if applicable).
-
-Conversation state is stored in memory only and will be lost when the process
-terminates.
+  - POST /conversations/{conversation_id}/messages/stream: same as above, but the
+    reply is streamed back as Server-Sent Events while it is generated.
+
+Conversation state is kept in a store (see `store`): in memory only by default,
+or in Redis when `REDIS_URL` is configured. Turns on the same conversation are
+serialized by the store's lock (a Redis lock across workers), while unrelated
+conversations are processed concurrently. Each turn's messages are appended to
+the store in one step, so readers never see half a turn.
 """
 
 from __future__ import annotations
 
-import json
-from typing import Dict, List
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List
 
+import orjson
 from fastapi import FastAPI, HTTPException, Path
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 
-from .llm import chat_turn
+from .llm import aclose_client, stream_chat, turn_batcher
 from .models import Conversation, Message
+from .store import ConversationStore, close_redis, create_conversation_store
+
+logger = logging.getLogger(__name__)
+
+# Roles returned to clients; tool messages stay internal
+_VISIBLE_ROLES = frozenset(("user", "assistant"))
+
+# Conversation store
+CONVERSATIONS: ConversationStore = create_conversation_store("conversations")
 
 
-app = FastAPI(title="Order Status Chatbot")
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Flush in-flight turns and close shared clients on shutdown."""
+    yield
+    await turn_batcher.aclose()
+    await aclose_client()
+    await close_redis()
 
-# In-memory conversation store
-CONVERSATIONS: Dict[str, Conversation] = {}
+
+app = FastAPI(
+    title="Order Status Chatbot",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
 
 
 class CreateConversationResponse(BaseModel):
@@ -52,12 +79,26 @@ class ConversationMessagesResponse(BaseModel):
     )
 
 
+async def _ensure_exists(conversation_id: str) -> None:
+    """Raise 404 if the conversation doesn't exist."""
+    if not await CONVERSATIONS.exists(conversation_id):
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+
+async def _get_conversation(conversation_id: str) -> Conversation:
+    """Return a snapshot of a conversation, or raise 404 if it doesn't exist."""
+    conv = await CONVERSATIONS.get(conversation_id)
+    if conv is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return conv
+
+
 @app.post("/conversations", response_model=CreateConversationResponse)
 async def create_conversation() -> CreateConversationResponse:
     """Start a new conversation and return its ID."""
     conv = Conversation()
-    conv_id = str(conv.conversation_id)
-    CONVERSATIONS[conv_id] = conv
+    conv_id = conv.conversation_id
+    await CONVERSATIONS.create(conv)
     return CreateConversationResponse(conversation_id=conv_id)
 
 
@@ -69,11 +110,10 @@ async def get_messages(
     conversation_id: str = Path(..., description="Conversation ID")
 ) -> ConversationMessagesResponse:
     """Retrieve the message history for a given conversation, excluding tool messages."""
-    conv = CONVERSATIONS.get(conversation_id)
-    if conv is None:
-        raise HTTPException(status_code=404, detail="Conversation not found")
+    # Turns are appended whole, so the snapshot never holds half a turn
+    conv = await _get_conversation(conversation_id)
     # Return only user and assistant messages
-    visible_messages = [m for m in conv.messages if m.role in {"user", "assistant"}]
+    visible_messages = [m for m in conv.messages if m.role in _VISIBLE_ROLES]
     return ConversationMessagesResponse(messages=visible_messages)
 
 
@@ -87,22 +127,87 @@ async def post_message(
     request: UserMessageRequest,
 ) -> AssistantMessageResponse:
     """Send a new user message and obtain the assistant's reply."""
-    conv = CONVERSATIONS.get(conversation_id)
-    if conv is None:
-        raise HTTPException(status_code=404, detail="Conversation not found")
-    # Create user message
-    user_msg = Message(role="user", content=request.content)
-    conv.messages.append(user_msg)
-    # Call LLM to get assistant reply (and optional tool result)
-    assistant_msg, tool_result = chat_turn(conv.messages)
-    # If a tool was invoked, record the tool message internally
-    if tool_result is not None:
-        tool_message = Message(
-            role="tool", content=json.dumps(tool_result), tool_name="tool"
+    await _ensure_exists(conversation_id)
+    async with CONVERSATIONS.lock(conversation_id):
+        # Re-read under the lock so we build on the latest history
+        conv = await _get_conversation(conversation_id)
+        start = len(conv.messages)
+        # Create user message
+        user_msg = Message(role="user", content=request.content)
+        conv.messages.append(user_msg)
+        # Batched with concurrent turns; awaiting keeps the event loop free
+        assistant_msg, tool_result = await turn_batcher.submit(
+            conv.messages, tool_cache=conv.tool_cache
         )
-        conv.messages.append(tool_message)
-    # Append assistant message
-    conv.messages.append(assistant_msg)
+        await _record_reply(conv, start, assistant_msg)
     return AssistantMessageResponse(
         assistant=assistant_msg.content, tool_result=tool_result
     )
+
+
+@app.post("/conversations/{conversation_id}/messages/stream")
+async def stream_message(
+    *,
+    conversation_id: str = Path(..., description="Conversation ID"),
+    request: UserMessageRequest,
+) -> StreamingResponse:
+    """
+    Send a new user message and stream the assistant's reply as Server-Sent Events.
+
+    Emits a `tool_result` event if a tool was invoked, `delta` events carrying
+    chunks of the reply, and a final `done` event with the complete reply. If the
+    turn fails partway, an `error` event is sent instead of `done` and the turn
+    is discarded.
+    """
+    await _ensure_exists(conversation_id)
+
+    async def events() -> AsyncIterator[bytes]:
+        async with CONVERSATIONS.lock(conversation_id):
+            conv = await _get_conversation(conversation_id)
+            start = len(conv.messages)
+            conv.messages.append(Message(role="user", content=request.content))
+            parts: List[str] = []
+            tool_result = None
+            try:
+                async for event, payload in stream_chat(
+                    conv.messages, tool_cache=conv.tool_cache
+                ):
+                    if event == "tool_result":
+                        tool_result = payload
+                        yield _sse("tool_result", payload)
+                    else:
+                        parts.append(payload)
+                        yield _sse("delta", {"content": payload})
+            except Exception:
+                # The response has already started, so the failure can only be
+                # reported in-band; the turn is not recorded
+                logger.exception("Streaming turn failed for %s", conversation_id)
+                failed = True
+            else:
+                failed = False
+                assistant_msg = Message(role="assistant", content="".join(parts))
+                await _record_reply(conv, start, assistant_msg)
+        if failed:
+            yield _sse("error", {"detail": "The assistant failed to reply."})
+            return
+        yield _sse(
+            "done", {"assistant": assistant_msg.content, "tool_result": tool_result}
+        )
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def _sse(event: str, data: dict) -> bytes:
+    """Encode a single Server-Sent Event."""
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+async def _record_reply(conv: Conversation, start: int, assistant_msg: Message) -> None:
+    """
+    Append a turn's reply to the conversation and persist the turn.
+
+    Messages from index start onwards (the user message, any tool message the
+    turn recorded, and the reply) are appended to the store in one step.
+    """
+    conv.messages.append(assistant_msg)
+    await CONVERSATIONS.append(conv.conversation_id, conv.messages[start:])
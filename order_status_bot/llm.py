@@ -2,25 +2,59 @@
 Abstractions for interacting with OpenAI's chat API using function calling.
 
 This module defines the tool functions used to look up and cancel orders and
-provides a `chat_turn` function that orchestrates the conversation loop with
-function calling. If the `OPENAI_API_KEY` environment variable is not set, a
+provides an async `chat_turn` function that orchestrates the conversation loop
+with function calling. If the `OPENAI_API_KEY` environment variable is not set, a
 simple fallback implementation will handle user queries deterministically.
+
+Completions are requested with temperature=0, so identical requests are served
+from a small in-process TTL/LRU cache instead of being sent to OpenAI again.
+Tools are always executed fresh; only the model's responses are cached.
+
+The request-building and tool-invocation helpers (`MODEL`, `FUNCTIONS_SPEC`,
+`get_client`, `to_openai_messages`, `invoke_function_call`, `record_tool_result`
+and `fallback_chat_turn`) are public so other front ends such as `llm_batch`
+can share them.
+
+Turns submitted through `turn_batcher` are coalesced over a short window and
+dispatched together, so concurrent turns share the pooled connections.
 """
 
 from __future__ import annotations
 
-import json
+import asyncio
+import hashlib
 import os
 import re
-from typing import Dict, List, Optional, Tuple
+import time
+from collections import OrderedDict
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
 
 try:
+    import httpx
     import openai  # type: ignore
 except ImportError:
     # If the openai package is unavailable, leave as None. The fallback will be used.
     openai = None  # type: ignore
 
-from pydantic import ValidationError
+try:
+    import h2  # type: ignore  # noqa: F401
+
+    _HTTP2 = True
+except ImportError:
+    # HTTP/2 needs the h2 package (httpx[http2]); otherwise stay on HTTP/1.1
+    _HTTP2 = False
+
+import orjson
+from pydantic import TypeAdapter, ValidationError
 
 from .models import (
     CancelOrderInput,
@@ -30,7 +64,117 @@ from .models import (
     Message,
 )
 from .orders import cancel_order as cancel_order_logic
-from .orders import get_order
+from .orders import get_order, lookups_block, overrides_version
+
+# Built once; validating through an adapter avoids per-call model setup
+_find_adapter = TypeAdapter(FindOrderInput)
+_cancel_adapter = TypeAdapter(CancelOrderInput)
+
+# Fallback parser patterns; digits need no case folding
+_ORDER_ID_RE = re.compile(r"\b(\d+)\b")
+_CANCEL_RE = re.compile(r"cancel", re.IGNORECASE)
+
+# Shared HTTP and AsyncOpenAI clients, created on first use so a single
+# connection pool is reused across turns instead of being rebuilt per request.
+_http_client = None
+_client = None
+
+
+def _build_http_client():
+    """Return a pooled, keep-alive HTTP client for talking to OpenAI."""
+    transport = httpx.AsyncHTTPTransport(
+        retries=3,
+        http2=_HTTP2,
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=64),
+    )
+    return httpx.AsyncClient(transport=transport, timeout=30)
+
+
+def get_client(api_key: str):
+    """Return the process-wide AsyncOpenAI client, creating it if needed."""
+    global _http_client, _client
+    if _http_client is None:
+        _http_client = _build_http_client()
+    if _client is None or _client.api_key != api_key:
+        _client = openai.AsyncOpenAI(api_key=api_key, http_client=_http_client)
+    return _client
+
+
+async def aclose_client() -> None:
+    """Close the shared HTTP client, if one was created."""
+    global _http_client, _client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+        _client = None
+
+
+class ResponseCache:
+    """
+    Least-recently-used cache with a per-entry time-to-live.
+
+    Keys are content hashes of completion requests; values are whatever the
+    caller stores (here, the first choice of a chat completion).
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 600.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+
+    @staticmethod
+    def make_key(request: dict) -> str:
+        """Return a stable hash for a completion request."""
+        encoded = orjson.dumps(request, option=orjson.OPT_SORT_KEYS, default=str)
+        return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+    def get(self, key: str) -> Any:
+        """Return the cached value for key, or None if missing or expired."""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Store value under key, evicting the least recently used entry if full."""
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+MODEL = "gpt-3.5-turbo-0613"
+_RESPONSE_CACHE = ResponseCache()
+
+
+async def _create_completion(client, *, use_cache: bool = True, **request):
+    """
+    Request a chat completion and return its first choice.
+
+    Only deterministic (temperature=0) requests are cached.
+    """
+    use_cache = use_cache and request.get("temperature") == 0
+    key = ResponseCache.make_key(request) if use_cache else None
+    if key is not None:
+        cached = _RESPONSE_CACHE.get(key)
+        if cached is not None:
+            return cached
+    response = await client.chat.completions.create(**request)
+    choice = response.choices[0]
+    if key is not None:
+        _RESPONSE_CACHE.set(key, choice)
+    return choice
 
 
 def find_order_tool(args: dict) -> FindOrderResult:
@@ -39,7 +183,7 @@ def find_order_tool(args: dict) -> FindOrderResult:
     Expects args to conform to FindOrderInput.
     """
     try:
-        input_model = FindOrderInput(**args)
+        input_model = _find_adapter.validate_python(args)
     except ValidationError as exc:
         raise ValueError(f"Invalid input for find_order: {exc}")
     order = get_order(input_model.order_id)
@@ -54,140 +198,297 @@ def cancel_order_tool(args: dict) -> CancelOrderResult:
     Expects args to conform to CancelOrderInput.
     """
     try:
-        input_model = CancelOrderInput(**args)
+        input_model = _cancel_adapter.validate_python(args)
     except ValidationError as exc:
         raise ValueError(f"Invalid input for cancel_order: {exc}")
     return cancel_order_logic(input_model.order_id)
 
 
-def _system_prompt() -> str:
-    """Return the system prompt for the order assistant."""
-    return (
-        "You are an order assistant. Use the available tools to look up or cancel "
-        "orders. Never invent order data. If the user requests to cancel an order "
-        "that is already shipped or canceled, explain that the order cannot be canceled."
-    )
+_TOOLS = {"find_order": find_order_tool, "cancel_order": cancel_order_tool}
+
 
+async def _call_tool(name: str, args: dict):
+    """Invoke the named tool, off the event loop if order lookups block."""
+    if lookups_block():
+        return await asyncio.to_thread(_TOOLS[name], args)
+    return _TOOLS[name](args)
+
+
+async def _run_tool(name: str, args: dict, tool_cache: Optional[Dict[str, Any]] = None):
+    """
+    Invoke the named tool, memoizing its result in tool_cache when provided.
 
-def _build_functions_spec() -> List[dict]:
-    """Return the OpenAI function definitions for our tools."""
-    return [
-        {
-            "name": "find_order",
-            "description": "Look up an order by order_id in the system.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "order_id": {
-                        "type": "string",
-                        "description": "The ID of the order to look up.",
-                    },
+    Cached results are tagged with the order overrides version at the time they
+    were computed and are discarded once a cancellation changes that version.
+    """
+    if tool_cache is None:
+        return await _call_tool(name, args)
+    key = f"{name}:{orjson.dumps(args, option=orjson.OPT_SORT_KEYS).decode()}"
+    version = overrides_version()
+    cached = tool_cache.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    result = await _call_tool(name, args)
+    tool_cache[key] = (version, result)
+    return result
+
+
+# Static request parts, built once and shared by every turn
+_SYSTEM_PROMPT = (
+    "You are an order assistant. Use the available tools to look up or cancel "
+    "orders. Never invent order data. If the user requests to cancel an order "
+    "that is already shipped or canceled, explain that the order cannot be canceled."
+)
+_SYSTEM_MSG = {"role": "system", "content": _SYSTEM_PROMPT}
+
+# OpenAI function definitions for our tools
+FUNCTIONS_SPEC = (
+    {
+        "name": "find_order",
+        "description": "Look up an order by order_id in the system.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "order_id": {
+                    "type": "string",
+                    "description": "The ID of the order to look up.",
                 },
-                "required": ["order_id"],
             },
+            "required": ["order_id"],
         },
-        {
-            "name": "cancel_order",
-            "description": "Cancel an existing order if it is still processing.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "order_id": {
-                        "type": "string",
-                        "description": "The ID of the order to cancel.",
-                    },
+    },
+    {
+        "name": "cancel_order",
+        "description": "Cancel an existing order if it is still processing.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "order_id": {
+                    "type": "string",
+                    "description": "The ID of the order to cancel.",
                 },
-                "required": ["order_id"],
             },
+            "required": ["order_id"],
         },
-    ]
+    },
+)
 
 
-def chat_turn(messages: List[Message]) -> Tuple[Message, Optional[Dict]]:
+def to_openai_messages(messages: List[Message]) -> List[dict]:
+    """Build the OpenAI request messages in a single pass, system prompt first."""
+    openai_messages = [_SYSTEM_MSG]
+    openai_messages.extend(
+        (
+            {"role": "tool", "content": msg.content, "name": msg.tool_name}
+            if msg.role == "tool"
+            else {"role": msg.role, "content": msg.content}
+        )
+        for msg in messages
+    )
+    return openai_messages
+
+
+async def invoke_function_call(
+    fn_name: str, fn_args_json: str, tool_cache: Optional[Dict[str, Any]] = None
+) -> Tuple[Any, Optional[Message]]:
+    """
+    Run the tool requested by a function call.
+
+    Returns:
+        A tuple of (result, error) where error is an assistant message to reply
+        with if the call could not be made; result is None in that case.
+    """
+    try:
+        args_dict = orjson.loads(fn_args_json)
+    except orjson.JSONDecodeError:
+        error = Message(
+            role="assistant", content="Sorry, I couldn't parse the tool arguments."
+        )
+        return None, error
+    if fn_name not in _TOOLS:
+        return None, Message(role="assistant", content=f"Unknown tool {fn_name}.")
+    return await _run_tool(fn_name, args_dict, tool_cache), None
+
+
+def record_tool_result(
+    messages: List[Message], fn_name: str, result: Any
+) -> Tuple[Dict, str]:
+    """
+    Dump a tool result once and append it to messages as a tool message.
+
+    Returns:
+        The result as a dict and its JSON text.
+    """
+    payload = result.model_dump(mode="python")
+    content = orjson.dumps(payload).decode()
+    messages.append(Message(role="tool", content=content, tool_name=fn_name))
+    return payload, content
+
+
+async def _tool_followup(
+    client, openai_messages: List[dict], fn_name: str, content: str
+) -> str:
+    """Send a tool's JSON output back to the model and return its final reply."""
+    openai_messages.append({"role": "tool", "content": content, "name": fn_name})
+    # Cancellations mutate state, so their follow-up is never cached
+    followup_choice = await _create_completion(
+        client,
+        use_cache=fn_name != "cancel_order",
+        model=MODEL,
+        messages=openai_messages,
+        temperature=0,
+    )
+    return followup_choice.message.content
+
+
+async def chat_turn(
+    messages: List[Message], tool_cache: Optional[Dict[str, Any]] = None
+) -> Tuple[Message, Optional[Dict]]:
     """
     Perform a single assistant turn given the conversation history.
 
     Args:
         messages: List of Message objects representing the conversation history.
+        tool_cache: Optional per-conversation dict used to memoize tool results.
 
     Returns:
         A tuple of (assistant_message, tool_result) where tool_result is a dict
         containing the JSON returned by a tool if one was invoked; otherwise None.
+        An invoked tool's result is also appended to messages as a tool message.
     """
     api_key = os.environ.get("OPENAI_API_KEY")
     # Only attempt to call OpenAI if both the API key and the openai package are present
     if not api_key or openai is None:
-        return _fallback_chat_turn(messages)
-    client = openai
-    client.api_key = api_key
-    openai_messages = []
-    for msg in messages:
-        if msg.role == "tool":
-            openai_messages.append(
-                {
-                    "role": "tool",
-                    "content": msg.content,
-                    "name": msg.tool_name,
-                }
-            )
-        else:
-            openai_messages.append({"role": msg.role, "content": msg.content})
-    openai_messages = [
-        {"role": "system", "content": _system_prompt()}
-    ] + openai_messages
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo-0613",
+        return await fallback_chat_turn(messages, tool_cache)
+    client = get_client(api_key)
+    openai_messages = to_openai_messages(messages)
+    choice = await _create_completion(
+        client,
+        model=MODEL,
         messages=openai_messages,
-        functions=_build_functions_spec(),
+        functions=FUNCTIONS_SPEC,
         function_call="auto",
         temperature=0,
     )
-    choice = response.choices[0]
     if choice.finish_reason == "function_call":
         fn_name = choice.message.function_call.name
-        fn_args_json = choice.message.function_call.arguments
-        try:
-            args_dict = json.loads(fn_args_json)
-        except json.JSONDecodeError:
-            assistant = Message(
-                role="assistant", content="Sorry, I couldn't parse the tool arguments."
-            )
-            return assistant, None
-        if fn_name == "find_order":
-            result = find_order_tool(args_dict)
-        elif fn_name == "cancel_order":
-            result = cancel_order_tool(args_dict)
-        else:
-            assistant = Message(role="assistant", content=f"Unknown tool {fn_name}.")
-            return assistant, None
-        tool_message = Message(role="tool", content=result.json(), tool_name=fn_name)
-        followup_messages = openai_messages + [
-            {
-                "role": "tool",
-                "content": tool_message.content,
-                "name": tool_message.tool_name,
-            }
-        ]
-        followup_response = client.chat.completions.create(
-            model="gpt-3.5-turbo-0613",
-            messages=followup_messages,
-            temperature=0,
+        result, error = await invoke_function_call(
+            fn_name, choice.message.function_call.arguments, tool_cache
         )
-        final_content = followup_response.choices[0].message.content
+        if error is not None:
+            return error, None
+        payload, content = record_tool_result(messages, fn_name, result)
+        final_content = await _tool_followup(client, openai_messages, fn_name, content)
         assistant = Message(role="assistant", content=final_content)
-        return assistant, result.model_dump()
+        return assistant, payload
     else:
         assistant = Message(role="assistant", content=choice.message.content)
         return assistant, None
 
 
-def _fallback_chat_turn(messages: List[Message]) -> Tuple[Message, Optional[Dict]]:
+def _streamed_choice(
+    finish_reason: str, content: str, fn_name: Optional[str], fn_args: List[str]
+):
+    """Rebuild the completion choice accumulated from a stream of chunks."""
+    chat = openai.types.chat
+    function_call = None
+    if fn_name is not None:
+        function_call = chat.chat_completion_message.FunctionCall(
+            name=fn_name, arguments="".join(fn_args)
+        )
+    message = chat.ChatCompletionMessage(
+        role="assistant",
+        content=None if function_call is not None else content,
+        function_call=function_call,
+    )
+    return chat.chat_completion.Choice(
+        index=0, finish_reason=finish_reason, message=message
+    )
+
+
+async def stream_chat(
+    messages: List[Message], tool_cache: Optional[Dict[str, Any]] = None
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Perform a single assistant turn, yielding the reply as it is generated.
+
+    Yields (event, payload) pairs: ("tool_result", dict) once if a tool was
+    invoked, then one or more ("delta", str) chunks of the assistant reply. As in
+    chat_turn, an invoked tool's result is also appended to messages. Only the
+    first completion is streamed; replies that follow a tool call arrive as a
+    single delta.
+    """
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key or openai is None:
+        assistant, tool_result = await fallback_chat_turn(messages, tool_cache)
+        if tool_result is not None:
+            yield "tool_result", tool_result
+        yield "delta", assistant.content
+        return
+    client = get_client(api_key)
+    openai_messages = to_openai_messages(messages)
+    request = dict(
+        model=MODEL,
+        messages=openai_messages,
+        functions=FUNCTIONS_SPEC,
+        function_call="auto",
+        temperature=0,
+    )
+    fn_name = None
+    fn_args = []
+    key = ResponseCache.make_key(request)
+    cached = _RESPONSE_CACHE.get(key)
+    if cached is not None:
+        # Replay a cached completion rather than streaming it again
+        if cached.finish_reason == "function_call":
+            fn_name = cached.message.function_call.name
+            fn_args.append(cached.message.function_call.arguments)
+        else:
+            yield "delta", cached.message.content
+    else:
+        stream = await client.chat.completions.create(**request, stream=True)
+        content = []
+        finish_reason = None
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            finish_reason = choice.finish_reason or finish_reason
+            delta = choice.delta
+            if delta.function_call is not None:
+                fn_name = fn_name or delta.function_call.name
+                if delta.function_call.arguments:
+                    fn_args.append(delta.function_call.arguments)
+            elif delta.content:
+                content.append(delta.content)
+                yield "delta", delta.content
+        if finish_reason is not None:
+            # Only complete streams are cached, in the same shape as non-streamed
+            # completions so either path can replay them
+            _RESPONSE_CACHE.set(
+                key, _streamed_choice(finish_reason, "".join(content), fn_name, fn_args)
+            )
+    if fn_name is None:
+        return
+    result, error = await invoke_function_call(fn_name, "".join(fn_args), tool_cache)
+    if error is not None:
+        yield "delta", error.content
+        return
+    payload, content = record_tool_result(messages, fn_name, result)
+    yield "tool_result", payload
+    yield "delta", await _tool_followup(client, openai_messages, fn_name, content)
+
+
+async def fallback_chat_turn(
+    messages: List[Message], tool_cache: Optional[Dict[str, Any]] = None
+) -> Tuple[Message, Optional[Dict]]:
     """
     A fallback implementation of the chat turn when no OpenAI API key is present.
 
     This simple parser searches the last user message for an order ID and infers
     the intent (lookup vs cancel) based on keywords. It returns a deterministic
-    assistant reply and includes the tool result dict when a tool is called.
+    assistant reply and includes the tool result dict when a tool is called,
+    appending the result to messages as a tool message like chat_turn does.
     """
     if not messages:
         return (
@@ -197,13 +498,13 @@ def _fallback_chat_turn(messages: List[Message]) -> Tuple[Message, Optional[Dict
     last_message = messages[-1]
     if last_message.role != "user":
         return Message(role="assistant", content="Awaiting your instructions."), None
-    content = last_message.content.lower()
-    match = re.search(r"\b(\d+)\b", content)
-    order_id = match.group(1) if match else None
-    if order_id is None:
+    content = last_message.content
+    match = _ORDER_ID_RE.search(content)
+    if match is None:
         return Message(role="assistant", content="Please provide an order ID."), None
-    if "cancel" in content:
-        result = cancel_order_tool({"order_id": order_id})
+    order_id = match.group(1)
+    if _CANCEL_RE.search(content):
+        result = await _run_tool("cancel_order", {"order_id": order_id}, tool_cache)
         if result.ok:
             msg = f"Order {order_id} has been canceled successfully."
         else:
@@ -211,14 +512,87 @@ def _fallback_chat_turn(messages: List[Message]) -> Tuple[Message, Optional[Dict
                 msg = f"I couldn't find an order with ID {order_id}."
             else:
                 msg = f"Order {order_id} cannot be canceled because it is {result.order.status}."
-        assistant = Message(role="assistant", content=msg)
-        return assistant, result.model_dump()
+        payload, _ = record_tool_result(messages, "cancel_order", result)
+        return Message(role="assistant", content=msg), payload
     else:
-        result = find_order_tool({"order_id": order_id})
+        result = await _run_tool("find_order", {"order_id": order_id}, tool_cache)
         if result.found:
             msg = f"Order {order_id} is currently {result.order.status}."
         else:
             msg = f"I couldn't find an order with ID {order_id}."
-        assistant = Message(role="assistant", content=msg)
         # return the dict representation whether found or not for consistency
-        return assistant, result.model_dump()
+        payload, _ = record_tool_result(messages, "find_order", result)
+        return Message(role="assistant", content=msg), payload
+
+
+class Batcher:
+    """
+    Coalesces concurrent chat turns into small batches.
+
+    Turns submitted within `window` seconds of each other (up to `max_batch`)
+    are dispatched together with asyncio.gather. Batches are dispatched as
+    background tasks, so a slow turn never holds up the next batch, and the
+    collecting task exits once the queue is empty.
+    """
+
+    def __init__(
+        self,
+        turn: Callable[..., Awaitable[Tuple[Message, Optional[Dict]]]],
+        max_batch: int = 16,
+        window: float = 0.005,
+    ) -> None:
+        self.turn = turn
+        self.max_batch = max_batch
+        self.window = window
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._dispatches: set = set()
+
+    async def submit(
+        self, messages: List[Message], tool_cache: Optional[Dict[str, Any]] = None
+    ) -> Tuple[Message, Optional[Dict]]:
+        """Queue a turn and wait for its result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        worker = self._worker
+        if worker is None or worker.done():
+            # Nothing is collecting, so start a new window on this loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._collect(self._queue))
+        self._queue.put_nowait((messages, tool_cache, future))
+        return await future
+
+    async def _collect(self, queue: asyncio.Queue) -> None:
+        """Dispatch queued turns in batches until the queue is drained."""
+        while not queue.empty():
+            await asyncio.sleep(self.window)
+            batch = []
+            while len(batch) < self.max_batch and not queue.empty():
+                batch.append(queue.get_nowait())
+            task = asyncio.create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, batch: list) -> None:
+        results = await asyncio.gather(
+            *[self.turn(messages, tool_cache) for messages, tool_cache, _ in batch],
+            return_exceptions=True,
+        )
+        for (_, _, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def aclose(self) -> None:
+        """Wait for queued and in-flight batches to finish."""
+        if self._worker is not None:
+            await self._worker
+            self._worker = None
+        if self._dispatches:
+            await asyncio.gather(*self._dispatches, return_exceptions=True)
+
+
+turn_batcher = Batcher(chat_turn)
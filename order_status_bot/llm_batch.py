@@ -0,0 +1,150 @@
+"""
+Offline chat turns through the OpenAI Batch API.
+
+The Batch API trades latency (results within 24 hours) for half the cost and
+much higher rate limits, which suits regression and evaluation runs rather
+than the live chat endpoint. `submit_batch` runs one assistant turn for each
+conversation history it is given and returns the same (assistant_message,
+tool_result) pairs as `llm.chat_turn`.
+
+A turn that calls a tool needs a second completion, so it takes up to two
+batches. First, every history is sent with the function spec. Tools are then
+run locally for the turns that requested one, and their follow-ups are sent as
+a second batch. Note that cancel_order calls really do cancel orders, exactly
+as in a live turn.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+from .llm import (
+    FUNCTIONS_SPEC,
+    MODEL,
+    fallback_chat_turn,
+    get_client,
+    invoke_function_call,
+    record_tool_result,
+    to_openai_messages,
+    openai,
+)
+from .models import Message
+
+_ENDPOINT = "/v1/chat/completions"
+_TERMINAL_STATUSES = frozenset(("completed", "failed", "expired", "cancelled"))
+
+
+async def _run_batch(client, bodies: List[dict], poll_interval: float) -> List[dict]:
+    """
+    Submit chat completion bodies as one batch and wait for it to finish.
+
+    Returns:
+        The first choice of each completion, in the order of bodies.
+    """
+    lines = [
+        json.dumps(
+            {"custom_id": str(i), "method": "POST", "url": _ENDPOINT, "body": body}
+        )
+        for i, body in enumerate(bodies)
+    ]
+    batch_file = await client.files.create(
+        file=("batch.jsonl", "\n".join(lines).encode()), purpose="batch"
+    )
+    batch = await client.batches.create(
+        input_file_id=batch_file.id, endpoint=_ENDPOINT, completion_window="24h"
+    )
+    while batch.status not in _TERMINAL_STATUSES:
+        await asyncio.sleep(poll_interval)
+        batch = await client.batches.retrieve(batch.id)
+    if batch.status != "completed" or batch.output_file_id is None:
+        raise RuntimeError(f"Batch {batch.id} ended with status {batch.status}")
+
+    output = await client.files.content(batch.output_file_id)
+    choices: List[Optional[dict]] = [None] * len(bodies)
+    for line in output.text.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        response = record.get("response") or {}
+        if response.get("status_code") != 200:
+            continue
+        choices[int(record["custom_id"])] = response["body"]["choices"][0]
+    failed = [i for i, choice in enumerate(choices) if choice is None]
+    if failed:
+        raise RuntimeError(f"Batch {batch.id} failed for requests {failed}")
+    return choices
+
+
+async def submit_batch(
+    requests: List[List[Message]], poll_interval: float = 30.0
+) -> List[Tuple[Message, Optional[Dict]]]:
+    """
+    Run one assistant turn per conversation history using the Batch API.
+
+    Args:
+        requests: Conversation histories, each a list of Message objects.
+        poll_interval: Seconds to wait between batch status checks.
+
+    Returns:
+        A list of (assistant_message, tool_result) tuples, one per request and
+        in the same order. As with chat_turn, each invoked tool's result is
+        also appended to its history. Without an OpenAI API key, the
+        deterministic fallback handles each request instead.
+    """
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key or openai is None:
+        return [await fallback_chat_turn(messages) for messages in requests]
+    if not requests:
+        return []
+    client = get_client(api_key)
+    histories = [to_openai_messages(messages) for messages in requests]
+    choices = await _run_batch(
+        client,
+        [
+            {
+                "model": MODEL,
+                "messages": history,
+                "functions": FUNCTIONS_SPEC,
+                "function_call": "auto",
+                "temperature": 0,
+            }
+            for history in histories
+        ],
+        poll_interval,
+    )
+
+    results: List[Optional[Tuple[Message, Optional[Dict]]]] = [None] * len(requests)
+    # Index of each request needing a follow-up, with its tool result
+    followups: List[Tuple[int, Dict]] = []
+    for i, choice in enumerate(choices):
+        message = choice["message"]
+        if choice["finish_reason"] != "function_call":
+            results[i] = (Message(role="assistant", content=message["content"]), None)
+            continue
+        fn_name = message["function_call"]["name"]
+        result, error = await invoke_function_call(
+            fn_name, message["function_call"]["arguments"]
+        )
+        if error is not None:
+            results[i] = (error, None)
+            continue
+        payload, content = record_tool_result(requests[i], fn_name, result)
+        histories[i].append({"role": "tool", "content": content, "name": fn_name})
+        followups.append((i, payload))
+
+    if followups:
+        followup_choices = await _run_batch(
+            client,
+            [
+                {"model": MODEL, "messages": histories[i], "temperature": 0}
+                for i, _ in followups
+            ],
+            poll_interval,
+        )
+        for (i, payload), choice in zip(followups, followup_choices):
+            assistant = Message(role="assistant", content=choice["message"]["content"])
+            results[i] = (assistant, payload)
+    return results
@@ -4,12 +4,19 @@ Pydantic data models for our order status chatbot.
 These classes define the structure of orders, messages, conversations, and the
 inputs/outputs for the supported tools. All models are strictly typed to
 ensure deterministic behaviour and validation throughout the application.
+
+`Message` is a slotted dataclass rather than a Pydantic model because it is
+created several times per turn; Pydantic still validates and serializes it
+wherever it appears in a model field.
 """
 
 from __future__ import annotations
 
+import os
+import time
 import uuid
-from typing import List, Literal, Optional
+from dataclasses import dataclass
+from typing import Any, Dict, List, Literal, Optional
 
 from pydantic import BaseModel, Field
 
@@ -24,31 +31,73 @@ class Order(BaseModel):
     item: str = Field(..., description="The product associated with the order.")
 
 
-class Message(BaseModel):
-    """Represents an entry in a conversation, either from the user, assistant or a tool."""
+@dataclass(slots=True)
+class Message:
+    """
+    Represents an entry in a conversation, either from the user, assistant or a tool.
 
-    role: Literal["user", "assistant", "tool"] = Field(
-        ...,
-        description="The origin of the message: user input, assistant response, or a tool output.",
-    )
-    content: str = Field(..., description="The textual content of the message.")
-    tool_name: Optional[str] = Field(
-        default=None,
-        description="Name of the tool when the role is 'tool', otherwise None.",
-    )
+    Attributes:
+        role: The origin of the message: user input, assistant response, or a
+            tool output.
+        content: The textual content of the message.
+        tool_name: Name of the tool when the role is 'tool', otherwise None.
+    """
+
+    role: Literal["user", "assistant", "tool"]
+    content: str
+    tool_name: Optional[str] = None
+
+
+_last_uuid7_ms = 0
+_uuid7_seq = 0
+
+
+def uuid7() -> uuid.UUID:
+    """
+    Return a time-ordered UUID (version 7, RFC 9562).
+
+    The top 48 bits are the Unix time in milliseconds. The 12-bit rand_a field
+    is a counter seeded randomly each millisecond, so IDs created in the same
+    millisecond still sort in creation order.
+    """
+    global _last_uuid7_ms, _uuid7_seq
+    ms = time.time_ns() // 1_000_000
+    if ms > _last_uuid7_ms:
+        _last_uuid7_ms = ms
+        _uuid7_seq = int.from_bytes(os.urandom(2), "big") & 0x7FF
+    else:
+        # Same (or an earlier) millisecond: keep ordering by bumping the counter
+        ms = _last_uuid7_ms
+        _uuid7_seq += 1
+        if _uuid7_seq > 0xFFF:
+            _last_uuid7_ms = ms = ms + 1
+            _uuid7_seq = 0
+    rand_b = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    value = (ms << 80) | (0x7 << 76) | (_uuid7_seq << 64) | (0b10 << 62) | rand_b
+    return uuid.UUID(int=value)
+
+
+def new_conversation_id() -> str:
+    """Return a new conversation ID as a string, ready to use as a store key."""
+    return str(uuid7())
 
 
 class Conversation(BaseModel):
     """Represents a conversation between the user and the assistant, maintaining context."""
 
-    conversation_id: uuid.UUID = Field(
-        default_factory=uuid.uuid4,
+    conversation_id: str = Field(
+        default_factory=new_conversation_id,
         description="The unique identifier for the conversation.",
     )
     messages: List[Message] = Field(
         default_factory=list,
         description="The sequential list of messages exchanged in the conversation.",
     )
+    tool_cache: Dict[str, Any] = Field(
+        default_factory=dict,
+        exclude=True,
+        description="Tool results memoized for this conversation; never serialized.",
+    )
 
 
 class FindOrderInput(BaseModel):
@@ -10,57 +10,125 @@ The business rules are:
   - Orders that are 'shipped' or already 'canceled' are not eligibile to cancel.
 
 All IDs are treated as strings to preserve formatting and to avoid type
-ambiguity. Cancellations are stored in the OVERRIDES dictionary for the
-duration of the server process; no file writes occur.
+ambiguity. Cancellations are stored in the OVERRIDES store; by default this is
+in memory for the duration of the server process, or in Redis when configured
+(see `store`), in which case every read sees cancellations made by other
+workers and the functions below block on Redis (see `lookups_block`). The CSV
+itself is never written. Every successful cancellation in this process bumps a
+version counter so callers caching order lookups can tell when their results
+are stale. The counter is per process and doesn't see cancellations made by
+other workers, so it only protects caches local to a single process.
 """
 
 from __future__ import annotations
 
 import csv
+from collections.abc import Mapping
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, Iterator, Optional
 
 from .models import Order, CancelOrderResult
-
-# In-memory stores for orders and overrides
-ORDERS: Dict[str, Order] = {}
-OVERRIDES: Dict[str, str] = {}
+from .store import Store, create_store
+
+# Base order data, stored as parallel columns keyed by order ID
+ORDER_STATUS: Dict[str, str] = {}
+ORDER_ITEM: Dict[str, str] = {}
+# Status overrides keyed by order ID
+OVERRIDES: Store = create_store("order_overrides")
+# Order objects handed out by get_order, rebuilt only when the status changes
+_ORDER_CACHE: Dict[str, Order] = {}
+# Incremented whenever this process changes OVERRIDES
+_overrides_version = 0
 
 # CSV file path relative to this module
 CSV_PATH = Path(__file__).with_name("orders.csv")
 
 
+class _OrderView(Mapping):
+    """Read-only mapping of order ID to base Order, built from the columns."""
+
+    def __getitem__(self, order_id: str) -> Order:
+        return Order.model_construct(
+            order_id=order_id,
+            status=ORDER_STATUS[order_id],
+            item=ORDER_ITEM[order_id],
+        )
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(ORDER_STATUS)
+
+    def __len__(self) -> int:
+        return len(ORDER_STATUS)
+
+    def __contains__(self, order_id: object) -> bool:
+        return order_id in ORDER_STATUS
+
+
+# Base orders as loaded from the CSV, without overrides applied
+ORDERS: Mapping[str, Order] = _OrderView()
+
+
 def _load_orders() -> None:
-    """Read the CSV and populate the ORDERS dictionary."""
-    ORDERS.clear()
+    """Read the CSV and populate the ORDER_STATUS and ORDER_ITEM columns."""
+    ORDER_STATUS.clear()
+    ORDER_ITEM.clear()
+    _ORDER_CACHE.clear()
     if not CSV_PATH.exists():
         raise FileNotFoundError(f"Order CSV not found at {CSV_PATH}")
     with CSV_PATH.open(newline="", encoding="utf-8") as csvfile:
-        reader = csv.DictReader(csvfile)
+        reader = csv.reader(csvfile)
+        header = next(reader, None)
+        if header is None:
+            return
+        columns = {name: i for i, name in enumerate(header)}
+        id_col = columns["order_id"]
+        status_col = columns["status"]
+        item_col = columns["item"]
+        width = max(id_col, status_col, item_col) + 1
         for row in reader:
-            order_id = row.get("order_id")
-            status = row.get("status")
-            item = row.get("item")
-            if not order_id or not status or not item:
+            if len(row) < width:
                 continue
-            oid = str(order_id)
-            order = Order(order_id=oid, status=status, item=item)
-            if oid not in ORDERS:
-                ORDERS[oid] = order
+            oid = row[id_col]
+            status = row[status_col]
+            item = row[item_col]
+            if not oid or not status or not item or oid in ORDER_STATUS:
+                continue
+            ORDER_STATUS[oid] = status
+            ORDER_ITEM[oid] = item
+
+
+def _current_status(oid: str) -> Optional[str]:
+    """Return the effective status of an order, or None if it doesn't exist."""
+    status = ORDER_STATUS.get(oid)
+    if status is None:
+        return None
+    return OVERRIDES.get(oid, status)
 
 
 def get_order(order_id: str) -> Optional[Order]:
-    """Retrieve an order by ID, applying any in-memory status overrides."""
+    """Retrieve an order by ID, applying any status overrides."""
     oid = str(order_id)
-    order = ORDERS.get(oid)
-    if order is None:
+    status = _current_status(oid)
+    if status is None:
         return None
-    override = OVERRIDES.get(oid)
-    if override is not None:
-        return Order(order_id=oid, status=override, item=order.item)
+    order = _ORDER_CACHE.get(oid)
+    if order is None or order.status != status:
+        # The CSV ships with the app, so skip validation when materializing
+        order = Order.model_construct(order_id=oid, status=status, item=ORDER_ITEM[oid])
+        _ORDER_CACHE[oid] = order
     return order
 
 
+def lookups_block() -> bool:
+    """Return whether order lookups and cancellations wait on network I/O."""
+    return OVERRIDES.blocking
+
+
+def overrides_version() -> int:
+    """Return a counter that changes whenever an order's status is overridden."""
+    return _overrides_version
+
+
 def cancel_order(order_id: str) -> CancelOrderResult:
     """
     Attempt to cancel an order.
@@ -68,15 +136,22 @@ def cancel_order(order_id: str) -> CancelOrderResult:
     Returns:
         CancelOrderResult reflecting success or failure.
     """
-    order = get_order(order_id)
-    if order is None:
+    oid = str(order_id)
+    status = _current_status(oid)
+    if status is None:
         return CancelOrderResult(ok=False, reason="not_found", order=None)
-    if order.status in {"shipped", "canceled"}:
-        return CancelOrderResult(ok=False, reason="immutable_status", order=order)
-    # Otherwise set override to canceled
-    OVERRIDES[str(order_id)] = "canceled"
-    updated = Order(order_id=str(order_id), status="canceled", item=order.item)
-    return CancelOrderResult(ok=True, reason=None, order=updated)
+    if status in {"shipped", "canceled"}:
+        return CancelOrderResult(
+            ok=False, reason="immutable_status", order=get_order(oid)
+        )
+    # Otherwise set override to canceled, unless another worker got there first
+    global _overrides_version
+    if not OVERRIDES.set_if_absent(oid, "canceled"):
+        return CancelOrderResult(
+            ok=False, reason="immutable_status", order=get_order(oid)
+        )
+    _overrides_version += 1
+    return CancelOrderResult(ok=True, reason=None, order=get_order(oid))
 
 
 # Load orders on import
@@ -0,0 +1,296 @@
+"""
+Stores backing order overrides and conversation state.
+
+By default both live in process memory. When the `REDIS_URL` environment
+variable is set and the `redis` package is installed, both are kept in Redis
+instead, so several workers share them and they survive a restart:
+
+  - `RedisStore` holds string values (order overrides) in a Redis hash. Every
+    read and write goes to Redis; `set_if_absent` maps to HSETNX, so a
+    check-and-set is atomic across workers. It uses the synchronous client
+    because the order functions are synchronous, so it sets `blocking` and
+    callers on the event loop must run it in a worker thread.
+  - `RedisConversationStore` keeps each conversation's messages in a Redis list
+    and appends new messages with RPUSH, so concurrent writers never overwrite
+    each other. Turns are serialized across workers with a Redis lock, which is
+    renewed for as long as the turn runs and expires `LOCK_TIMEOUT` seconds
+    after a worker dies. A conversation's `tool_cache` is not stored, so tool
+    results are only memoized across turns in memory mode; the overrides
+    version that invalidates them is per process and couldn't be shared anyway.
+
+Both Redis clients share connection pools capped at `MAX_CONNECTIONS`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from typing import AsyncContextManager, Dict, List, Optional, Protocol
+
+import orjson
+
+try:
+    import redis  # type: ignore
+    import redis.asyncio as aioredis  # type: ignore
+except ImportError:
+    # Without redis, only the in-memory stores are available.
+    redis = None  # type: ignore
+    aioredis = None  # type: ignore
+
+from .models import Conversation, Message
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on connections in each shared Redis pool
+MAX_CONNECTIONS = 32
+# Seconds after which a conversation lock held by a dead worker expires; live
+# holders renew it every third of this
+LOCK_TIMEOUT = 30
+
+
+class Store(Protocol):
+    """
+    Interface for string key-value stores.
+
+    `blocking` is True when calls wait on network I/O and so must not be made
+    directly from the event loop.
+    """
+
+    blocking: bool
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """Return the value for key, or default if it is unset."""
+
+    def set(self, key: str, value: str) -> None:
+        """Store value under key."""
+
+    def set_if_absent(self, key: str, value: str) -> bool:
+        """Store value under key unless it is already set; return True if stored."""
+
+
+class MemoryStore:
+    """A string store that lives entirely in process memory."""
+
+    blocking = False
+
+    def __init__(self) -> None:
+        self._data: Dict[str, str] = {}
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        return self._data.get(key, default)
+
+    def set(self, key: str, value: str) -> None:
+        self._data[key] = value
+
+    def set_if_absent(self, key: str, value: str) -> bool:
+        if key in self._data:
+            return False
+        self._data[key] = value
+        return True
+
+
+class RedisStore:
+    """A string store kept in a single Redis hash."""
+
+    blocking = True
+
+    def __init__(self, client, namespace: str) -> None:
+        self._client = client
+        self._namespace = namespace
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        value = self._client.hget(self._namespace, key)
+        return default if value is None else value
+
+    def set(self, key: str, value: str) -> None:
+        self._client.hset(self._namespace, key, value)
+
+    def set_if_absent(self, key: str, value: str) -> bool:
+        return bool(self._client.hsetnx(self._namespace, key, value))
+
+
+class ConversationStore(Protocol):
+    """Interface for conversation stores."""
+
+    async def create(self, conv: Conversation) -> None:
+        """Register a new, empty conversation."""
+
+    async def exists(self, conversation_id: str) -> bool:
+        """Return whether the conversation exists."""
+
+    async def get(self, conversation_id: str) -> Optional[Conversation]:
+        """Return a snapshot of the conversation, or None if it doesn't exist."""
+
+    async def append(self, conversation_id: str, messages: List[Message]) -> None:
+        """Atomically append messages to the stored conversation."""
+
+    def lock(self, conversation_id: str) -> AsyncContextManager:
+        """Return a lock serializing turns on the conversation."""
+
+
+class _LockTable(dict):
+    """Maps conversation IDs to locks, creating a lock on first access."""
+
+    def __missing__(self, conversation_id: str) -> asyncio.Lock:
+        lock = self[conversation_id] = asyncio.Lock()
+        return lock
+
+
+class MemoryConversationStore:
+    """A conversation store that lives entirely in process memory."""
+
+    def __init__(self) -> None:
+        self._conversations: Dict[str, Conversation] = {}
+        self._locks: Dict[str, asyncio.Lock] = _LockTable()
+
+    async def create(self, conv: Conversation) -> None:
+        self._conversations[conv.conversation_id] = conv
+
+    async def exists(self, conversation_id: str) -> bool:
+        return conversation_id in self._conversations
+
+    async def get(self, conversation_id: str) -> Optional[Conversation]:
+        conv = self._conversations.get(conversation_id)
+        if conv is None:
+            return None
+        # Shallow copy: callers may extend the messages, but the tool cache
+        # stays shared with the stored conversation
+        return conv.model_copy(update={"messages": list(conv.messages)})
+
+    async def append(self, conversation_id: str, messages: List[Message]) -> None:
+        self._conversations[conversation_id].messages.extend(messages)
+
+    def lock(self, conversation_id: str) -> asyncio.Lock:
+        return self._locks[conversation_id]
+
+
+class _RenewedLock:
+    """
+    Async context manager holding a Redis lock and renewing it until exit.
+
+    Turns can outlast any fixed expiry (two completions with retries, or a slow
+    streaming client), so the lock is reacquired periodically instead.
+    """
+
+    def __init__(self, lock) -> None:
+        self._lock = lock
+        self._renewer: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> _RenewedLock:
+        await self._lock.acquire()
+        self._renewer = asyncio.create_task(self._renew())
+        return self
+
+    async def _renew(self) -> None:
+        while True:
+            await asyncio.sleep(LOCK_TIMEOUT / 3)
+            await self._lock.reacquire()
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._renewer.cancel()
+        await asyncio.gather(self._renewer, return_exceptions=True)
+        try:
+            await self._lock.release()
+        except redis.exceptions.LockNotOwnedError:
+            # The turn has already been saved, so don't fail the request over it
+            logger.warning(
+                "Conversation lock %s expired before release", self._lock.name
+            )
+
+
+class RedisConversationStore:
+    """
+    A conversation store backed by Redis.
+
+    Conversation IDs are members of the `namespace` set, and each conversation's
+    messages are JSON entries in the list `<namespace>:<id>:messages`.
+    """
+
+    def __init__(self, client, namespace: str) -> None:
+        self._client = client
+        self._namespace = namespace
+
+    def _messages_key(self, conversation_id: str) -> str:
+        return f"{self._namespace}:{conversation_id}:messages"
+
+    async def create(self, conv: Conversation) -> None:
+        await self._client.sadd(self._namespace, conv.conversation_id)
+        if conv.messages:
+            await self.append(conv.conversation_id, conv.messages)
+
+    async def exists(self, conversation_id: str) -> bool:
+        return bool(await self._client.sismember(self._namespace, conversation_id))
+
+    async def get(self, conversation_id: str) -> Optional[Conversation]:
+        if not await self.exists(conversation_id):
+            return None
+        raw = await self._client.lrange(self._messages_key(conversation_id), 0, -1)
+        messages = [Message(**orjson.loads(entry)) for entry in raw]
+        # Each snapshot starts with an empty tool cache (see the module docstring)
+        return Conversation(conversation_id=conversation_id, messages=messages)
+
+    async def append(self, conversation_id: str, messages: List[Message]) -> None:
+        if messages:
+            await self._client.rpush(
+                self._messages_key(conversation_id),
+                *[orjson.dumps(message) for message in messages],
+            )
+
+    def lock(self, conversation_id: str) -> AsyncContextManager:
+        return _RenewedLock(
+            self._client.lock(
+                f"{self._namespace}:{conversation_id}:lock", timeout=LOCK_TIMEOUT
+            )
+        )
+
+
+_redis_client = None
+_async_redis_client = None
+
+
+def _redis_url() -> Optional[str]:
+    """Return the configured Redis URL, or None if Redis can't be used."""
+    url = os.environ.get("REDIS_URL")
+    if not url or redis is None:
+        return None
+    return url
+
+
+def create_store(namespace: str) -> Store:
+    """Return a string store for namespace, in Redis when REDIS_URL is set."""
+    global _redis_client
+    url = _redis_url()
+    if url is None:
+        return MemoryStore()
+    if _redis_client is None:
+        pool = redis.ConnectionPool.from_url(
+            url, max_connections=MAX_CONNECTIONS, decode_responses=True
+        )
+        _redis_client = redis.Redis(connection_pool=pool)
+    return RedisStore(_redis_client, namespace)
+
+
+def create_conversation_store(namespace: str) -> ConversationStore:
+    """Return a conversation store for namespace, in Redis when REDIS_URL is set."""
+    global _async_redis_client
+    url = _redis_url()
+    if url is None:
+        return MemoryConversationStore()
+    if _async_redis_client is None:
+        pool = aioredis.ConnectionPool.from_url(
+            url, max_connections=MAX_CONNECTIONS, decode_responses=True
+        )
+        _async_redis_client = aioredis.Redis(connection_pool=pool)
+    return RedisConversationStore(_async_redis_client, namespace)
+
+
+async def close_redis() -> None:
+    """Close the shared Redis connection pools, if any were created."""
+    global _redis_client, _async_redis_client
+    if _async_redis_client is not None:
+        await _async_redis_client.aclose()
+        _async_redis_client = None
+    if _redis_client is not None:
+        _redis_client.close()
+        _redis_client = None
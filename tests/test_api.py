@@ -1,3 +1,5 @@
+import asyncio
+import json
 import uuid
 
 import pytest
@@ -58,3 +60,98 @@ async def test_conversation_flow():
         tool3 = data3["tool_result"]
         assert tool3["found"] is True
         assert tool3["order"]["status"] == "canceled"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_messages_same_conversation():
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        conv_id = (await client.post("/conversations")).json()["conversation_id"]
+        responses = await asyncio.gather(
+            *[
+                client.post(
+                    f"/conversations/{conv_id}/messages",
+                    json={"content": f"check order {oid}"},
+                )
+                for oid in ("12345", "34567", "99999")
+            ]
+        )
+        assert all(r.status_code == 200 for r in responses)
+
+        # Each user message must be immediately followed by its own reply
+        messages = (await client.get(f"/conversations/{conv_id}/messages")).json()[
+            "messages"
+        ]
+        assert len(messages) == 6
+        for user, assistant in zip(messages[::2], messages[1::2]):
+            assert user["role"] == "user"
+            assert assistant["role"] == "assistant"
+            assert user["content"].split()[-1] in assistant["content"]
+
+
+@pytest.mark.asyncio
+async def test_conversation_ids_are_time_ordered():
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        ids = [
+            (await client.post("/conversations")).json()["conversation_id"]
+            for _ in range(5)
+        ]
+    assert all(uuid.UUID(conv_id).version == 7 for conv_id in ids)
+    assert ids == sorted(ids)
+
+
+@pytest.mark.asyncio
+async def test_stream_message():
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        conv_id = (await client.post("/conversations")).json()["conversation_id"]
+        resp = await client.post(
+            f"/conversations/{conv_id}/messages/stream",
+            json={"content": "check order 12345"},
+        )
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/event-stream")
+        events = [
+            (block.split("\n")[0][len("event: ") :], block.split("\n")[1][6:])
+            for block in resp.text.strip().split("\n\n")
+        ]
+        names = [name for name, _ in events]
+        assert names[0] == "tool_result"
+        assert names[-1] == "done"
+        done = json.loads(events[-1][1])
+        assert "12345" in done["assistant"]
+        assert done["tool_result"]["order"]["status"] == "shipped"
+
+        # The streamed reply is recorded in the conversation history
+        messages = (await client.get(f"/conversations/{conv_id}/messages")).json()[
+            "messages"
+        ]
+        assert [m["role"] for m in messages] == ["user", "assistant"]
+        assert messages[1]["content"] == done["assistant"]
+
+
+@pytest.mark.asyncio
+async def test_stream_message_reports_failure(monkeypatch):
+    from order_status_bot import app as app_module
+
+    async def failing_stream(messages, tool_cache=None):
+        yield "delta", "Let me check"
+        raise RuntimeError("upstream error")
+
+    monkeypatch.setattr(app_module, "stream_chat", failing_stream)
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        conv_id = (await client.post("/conversations")).json()["conversation_id"]
+        resp = await client.post(
+            f"/conversations/{conv_id}/messages/stream",
+            json={"content": "check order 12345"},
+        )
+        assert resp.status_code == 200
+        names = [
+            block.split("\n")[0][len("event: ") :]
+            for block in resp.text.strip().split("\n\n")
+        ]
+        assert names == ["delta", "error"]
+
+        # The failed turn is not recorded
+        messages = (await client.get(f"/conversations/{conv_id}/messages")).json()[
+            "messages"
+        ]
+        assert messages == []
@@ -0,0 +1,217 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from order_status_bot import llm, orders
+from order_status_bot.llm import Batcher, ResponseCache, chat_turn, stream_chat
+from order_status_bot.models import Message
+from order_status_bot.store import MemoryStore
+
+
+class FakeCompletions:
+    """Stand-in for client.chat.completions that records each request."""
+
+    def __init__(self, content: str = "Hello!") -> None:
+        self.content = content
+        self.function_call = None
+        self.calls = []
+
+    async def create(self, **request):
+        # Snapshot the messages, since callers may reuse the list afterwards
+        self.calls.append({**request, "messages": list(request["messages"])})
+        if request.get("stream"):
+            return self._stream()
+        if self.function_call is not None and "functions" in request:
+            name, arguments = self.function_call
+            function_call = SimpleNamespace(name=name, arguments=arguments)
+            message = SimpleNamespace(content=None, function_call=function_call)
+            choice = SimpleNamespace(finish_reason="function_call", message=message)
+        else:
+            message = SimpleNamespace(content=self.content, function_call=None)
+            choice = SimpleNamespace(finish_reason="stop", message=message)
+        return SimpleNamespace(choices=[choice])
+
+    async def _stream(self):
+        # Split content, or function-call arguments, into 4-character chunks
+        if self.function_call is not None:
+            name, arguments = self.function_call
+            deltas = [
+                SimpleNamespace(
+                    content=None,
+                    function_call=SimpleNamespace(
+                        name=name if i == 0 else None, arguments=arguments[i : i + 4]
+                    ),
+                )
+                for i in range(0, len(arguments), 4)
+            ]
+            finish_reason = "function_call"
+        else:
+            deltas = [
+                SimpleNamespace(content=self.content[i : i + 4], function_call=None)
+                for i in range(0, len(self.content), 4)
+            ]
+            finish_reason = "stop"
+        for i, delta in enumerate(deltas):
+            last = i == len(deltas) - 1
+            choice = SimpleNamespace(
+                delta=delta, finish_reason=finish_reason if last else None
+            )
+            yield SimpleNamespace(choices=[choice])
+
+
+@pytest.fixture
+def fake_completions(monkeypatch):
+    completions = FakeCompletions()
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(llm, "get_client", lambda api_key: client)
+    llm._RESPONSE_CACHE.clear()
+    yield completions
+    llm._RESPONSE_CACHE.clear()
+
+
+def test_response_cache_expires_and_evicts(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(llm.time, "monotonic", lambda: now[0])
+    cache = ResponseCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)  # evicts "b", the least recently used
+    assert cache.get("b") is None
+    assert len(cache) == 2
+    now[0] = 11.0
+    assert cache.get("a") is None
+
+
+async def test_identical_turns_hit_cache(fake_completions):
+    history = [Message(role="user", content="hi there")]
+    first, _ = await chat_turn(history)
+    second, _ = await chat_turn(list(history))
+    assert first.content == second.content == "Hello!"
+    assert len(fake_completions.calls) == 1
+
+    await chat_turn(history + [Message(role="user", content="something else")])
+    assert len(fake_completions.calls) == 2
+
+
+async def test_tool_cache_invalidated_by_cancel(monkeypatch):
+    monkeypatch.setattr(orders, "OVERRIDES", MemoryStore())
+    cache = {}
+    first = await llm._run_tool("find_order", {"order_id": "23456"}, cache)
+    assert await llm._run_tool("find_order", {"order_id": "23456"}, cache) is first
+    assert first.order.status == "processing"
+
+    await llm._run_tool("cancel_order", {"order_id": "23456"}, cache)
+    after = await llm._run_tool("find_order", {"order_id": "23456"}, cache)
+    assert after is not first
+    assert after.order.status == "canceled"
+
+
+async def test_blocking_lookups_run_off_the_event_loop(monkeypatch):
+    class SlowStore(MemoryStore):
+        # Stands in for a Redis server with a 200 ms round trip
+        blocking = True
+
+        def get(self, key, default=None):
+            time.sleep(0.2)
+            return super().get(key, default)
+
+    monkeypatch.setattr(orders, "OVERRIDES", SlowStore())
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    result = await llm._run_tool("find_order", {"order_id": "12345"})
+    task.cancel()
+    assert result.found is True
+    assert ticks >= 5
+
+
+async def test_function_call_runs_tool_and_follows_up(fake_completions):
+    fake_completions.function_call = ("find_order", '{"order_id": "12345"}')
+    fake_completions.content = "Order 12345 has shipped."
+    history = [Message(role="user", content="where is 12345?")]
+    assistant, tool_result = await chat_turn(history)
+    assert assistant.content == "Order 12345 has shipped."
+    assert tool_result["found"] is True
+    assert tool_result["order"]["status"] == "shipped"
+
+    # The turn records the tool message in the history it was given
+    recorded = history[-1]
+    assert (recorded.role, recorded.tool_name) == ("tool", "find_order")
+
+    first, followup = fake_completions.calls
+    assert first["messages"][0]["role"] == "system"
+    tool_message = followup["messages"][-1]
+    assert tool_message["role"] == "tool"
+    assert tool_message["name"] == "find_order"
+    assert tool_message["content"] == recorded.content
+
+
+async def test_batcher_coalesces_concurrent_turns():
+    batches = []
+
+    class RecordingBatcher(Batcher):
+        async def _dispatch(self, batch):
+            batches.append([messages[-1].content for messages, _, _ in batch])
+            await super()._dispatch(batch)
+
+    async def turn(messages, tool_cache):
+        await asyncio.sleep(0)
+        if messages[-1].content == "boom":
+            raise RuntimeError("boom")
+        return Message(role="assistant", content=messages[-1].content.upper()), None
+
+    batcher = RecordingBatcher(turn, max_batch=2, window=0.01)
+    results = await asyncio.gather(
+        *[
+            batcher.submit([Message(role="user", content=text)])
+            for text in ("a", "b", "boom")
+        ],
+        return_exceptions=True,
+    )
+    await batcher.aclose()
+
+    assert batches == [["a", "b"], ["boom"]]
+    assert results[0][0].content == "A"
+    assert results[1][0].content == "B"
+    assert isinstance(results[2], RuntimeError)
+
+
+async def test_stream_chat_yields_deltas(fake_completions):
+    fake_completions.content = "Your order has shipped."
+    history = [Message(role="user", content="status please")]
+    events = [event async for event in stream_chat(history)]
+    assert len(events) > 1
+    assert all(kind == "delta" for kind, _ in events)
+    assert "".join(text for _, text in events) == "Your order has shipped."
+    assert fake_completions.calls[0]["stream"] is True
+
+    # The streamed completion is cached, so the same turn isn't sent again
+    replayed = [event async for event in stream_chat(list(history))]
+    assert replayed == [("delta", "Your order has shipped.")]
+    assert len(fake_completions.calls) == 1
+
+
+async def test_stream_chat_joins_split_function_call_arguments(fake_completions):
+    fake_completions.function_call = ("find_order", '{"order_id": "12345"}')
+    fake_completions.content = "Order 12345 has shipped."
+    history = [Message(role="user", content="where is 12345?")]
+    events = [event async for event in stream_chat(list(history))]
+    assert events[0][0] == "tool_result"
+    assert events[0][1]["found"] is True
+    assert events[1] == ("delta", "Order 12345 has shipped.")
+    assert len(fake_completions.calls) == 2
+
+    # Replaying the cached choice reassembles the same function call
+    replayed = [event async for event in stream_chat(list(history))]
+    assert replayed == events
+    assert len(fake_completions.calls) == 2
@@ -0,0 +1,92 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from order_status_bot import llm_batch
+from order_status_bot.llm_batch import submit_batch
+from order_status_bot.models import Message
+
+
+class FakeBatchClient:
+    """Serves the files/batches endpoints, answering each request in-process."""
+
+    def __init__(self) -> None:
+        self.uploads = []
+        self.files = SimpleNamespace(create=self._create_file, content=self._content)
+        self.batches = SimpleNamespace(
+            create=self._create_batch, retrieve=self._retrieve_batch
+        )
+
+    async def _create_file(self, file, purpose):
+        assert purpose == "batch"
+        self.uploads.append([json.loads(line) for line in file[1].splitlines()])
+        return SimpleNamespace(id=f"file-{len(self.uploads)}")
+
+    async def _create_batch(self, input_file_id, endpoint, completion_window):
+        return SimpleNamespace(id=input_file_id, status="in_progress")
+
+    async def _retrieve_batch(self, batch_id):
+        return SimpleNamespace(
+            id=batch_id, status="completed", output_file_id=f"out-{batch_id}"
+        )
+
+    async def _content(self, file_id):
+        lines = self.uploads[int(file_id.rsplit("-", 1)[1]) - 1]
+        return SimpleNamespace(
+            text="\n".join(json.dumps(self._answer(line)) for line in lines)
+        )
+
+    @staticmethod
+    def _answer(line):
+        body = line["body"]
+        last = body["messages"][-1]
+        if "functions" in body and "12345" in last["content"]:
+            message = {
+                "content": None,
+                "function_call": {
+                    "name": "find_order",
+                    "arguments": '{"order_id": "12345"}',
+                },
+            }
+            choice = {"finish_reason": "function_call", "message": message}
+        else:
+            choice = {"finish_reason": "stop", "message": {"content": "done"}}
+        response = {"status_code": 200, "body": {"choices": [choice]}}
+        return {"custom_id": line["custom_id"], "response": response}
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    client = FakeBatchClient()
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(llm_batch, "get_client", lambda api_key: client)
+    return client
+
+
+async def test_submit_batch_runs_tools_between_batches(fake_client):
+    results = await submit_batch(
+        [
+            [Message(role="user", content="hello")],
+            [Message(role="user", content="where is 12345?")],
+        ],
+        poll_interval=0,
+    )
+    assert [assistant.content for assistant, _ in results] == ["done", "done"]
+    assert results[0][1] is None
+    assert results[1][1]["order"]["status"] == "shipped"
+
+    # Only the turn that called a tool needed a follow-up batch
+    first, followup = fake_client.uploads
+    assert len(first) == 2
+    assert len(followup) == 1
+    assert followup[0]["body"]["messages"][-1]["name"] == "find_order"
+
+
+async def test_submit_batch_without_api_key_uses_fallback(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    [(assistant, tool_result)] = await submit_batch(
+        [[Message(role="user", content="check order 12345")]]
+    )
+    assert "shipped" in assistant.content
+    assert tool_result["found"] is True
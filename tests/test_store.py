@@ -0,0 +1,177 @@
+import asyncio
+
+import pytest
+
+from order_status_bot import orders, store
+from order_status_bot.models import Conversation, Message
+from order_status_bot.store import (
+    MemoryConversationStore,
+    MemoryStore,
+    RedisConversationStore,
+    RedisStore,
+    create_conversation_store,
+    create_store,
+)
+
+
+class FakeRedis:
+    """Minimal stand-in for the synchronous redis hash commands."""
+
+    def __init__(self) -> None:
+        self.hashes = {}
+
+    def hget(self, name, key):
+        return self.hashes.get(name, {}).get(key)
+
+    def hset(self, name, key, value):
+        self.hashes.setdefault(name, {})[key] = value
+
+    def hsetnx(self, name, key, value):
+        fields = self.hashes.setdefault(name, {})
+        if key in fields:
+            return 0
+        fields[key] = value
+        return 1
+
+
+class FakeLock:
+    """Stand-in for a redis.asyncio lock; locks with the same name are shared."""
+
+    def __init__(self, name, lock) -> None:
+        self.name = name
+        self._lock = lock
+        self.renewals = 0
+        self.release_error = None
+
+    async def acquire(self):
+        await self._lock.acquire()
+
+    async def reacquire(self):
+        self.renewals += 1
+
+    async def release(self):
+        self._lock.release()
+        if self.release_error is not None:
+            raise self.release_error
+
+
+class FakeAsyncRedis:
+    """Minimal stand-in for the redis.asyncio set, list and lock commands."""
+
+    def __init__(self) -> None:
+        self.sets = {}
+        self.lists = {}
+        self.locks = {}
+
+    async def sadd(self, name, member):
+        self.sets.setdefault(name, set()).add(member)
+
+    async def sismember(self, name, member):
+        return member in self.sets.get(name, set())
+
+    async def rpush(self, name, *values):
+        self.lists.setdefault(name, []).extend(v.decode() for v in values)
+
+    async def lrange(self, name, start, end):
+        return list(self.lists.get(name, []))
+
+    def lock(self, name, timeout=None):
+        self.last_lock = FakeLock(name, self.locks.setdefault(name, asyncio.Lock()))
+        return self.last_lock
+
+
+def test_create_stores_default_to_memory(monkeypatch):
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    assert isinstance(create_conversation_store("test"), MemoryConversationStore)
+    store = create_store("test")
+    assert isinstance(store, MemoryStore)
+    assert store.set_if_absent("a", "1") is True
+    assert store.set_if_absent("a", "2") is False
+    assert store.get("a") == "1"
+    assert store.get("missing", "x") == "x"
+
+
+def test_cancel_is_visible_to_other_workers(monkeypatch):
+    client = FakeRedis()
+    worker_a = RedisStore(client, "order_overrides")
+    worker_b = RedisStore(client, "order_overrides")
+
+    monkeypatch.setattr(orders, "OVERRIDES", worker_a)
+    assert orders.cancel_order("23456").ok is True
+
+    monkeypatch.setattr(orders, "OVERRIDES", worker_b)
+    assert orders.get_order("23456").status == "canceled"
+    again = orders.cancel_order("23456")
+    assert again.ok is False
+    assert again.reason == "immutable_status"
+
+
+def test_cancel_loses_race_atomically(monkeypatch):
+    class StaleReads(MemoryStore):
+        # Another worker cancels between our status read and our write
+        def get(self, key, default=None):
+            return default
+
+    store = StaleReads()
+    store.set("23456", "canceled")
+    monkeypatch.setattr(orders, "OVERRIDES", store)
+    result = orders.cancel_order("23456")
+    assert result.ok is False
+    assert result.reason == "immutable_status"
+
+
+async def test_redis_conversations_append_without_overwriting():
+    client = FakeAsyncRedis()
+    worker_a = RedisConversationStore(client, "conversations")
+    worker_b = RedisConversationStore(client, "conversations")
+    conv = Conversation()
+    await worker_a.create(conv)
+    assert await worker_b.exists(conv.conversation_id)
+    assert await worker_b.get("missing") is None
+
+    # Both workers start from the same (empty) snapshot
+    stale_a = await worker_a.get(conv.conversation_id)
+    stale_b = await worker_b.get(conv.conversation_id)
+    assert stale_a.messages == stale_b.messages == []
+    await worker_a.append(
+        conv.conversation_id, [Message(role="user", content="from a")]
+    )
+    await worker_b.append(
+        conv.conversation_id, [Message(role="user", content="from b")]
+    )
+
+    loaded = await worker_a.get(conv.conversation_id)
+    assert [m.content for m in loaded.messages] == ["from a", "from b"]
+
+
+async def test_redis_lock_serializes_workers_and_renews(monkeypatch):
+    exceptions = pytest.importorskip("redis.exceptions")
+    monkeypatch.setattr(store, "LOCK_TIMEOUT", 0.03)
+    client = FakeAsyncRedis()
+    worker_a = RedisConversationStore(client, "conversations")
+    worker_b = RedisConversationStore(client, "conversations")
+
+    async with worker_a.lock("c1"):
+        held = client.last_lock
+        waiter = asyncio.create_task(worker_b.lock("c1").__aenter__())
+        # A turn outlasting LOCK_TIMEOUT keeps its lock renewed
+        await asyncio.sleep(0.1)
+        assert not waiter.done()
+        assert held.renewals >= 2
+    await waiter
+    # Losing the lock before release doesn't fail the finished turn
+    client.last_lock.release_error = exceptions.LockNotOwnedError("expired")
+    await waiter.result().__aexit__(None, None, None)
+
+
+async def test_memory_conversation_snapshots_are_isolated():
+    store = MemoryConversationStore()
+    conv = Conversation()
+    await store.create(conv)
+    snapshot = await store.get(conv.conversation_id)
+    snapshot.messages.append(Message(role="user", content="draft"))
+    assert (await store.get(conv.conversation_id)).messages == []
+
+    await store.append(conv.conversation_id, snapshot.messages)
+    assert len((await store.get(conv.conversation_id)).messages) == 1
+    assert snapshot.tool_cache is conv.tool_cache